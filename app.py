@@ -8,6 +8,9 @@ from requests_oauthlib import OAuth2Session
 from functools import wraps
 from dateutil import parser as parse
 import traceback
+import threading
+import fcntl
+import tempfile
 
 # Load API key and base URL from config.json
 with open("config.json", "r") as config_file:
@@ -52,7 +55,72 @@ app.config.update(
 CACHE_TIMEOUT = 3600  # 1 hour in seconds
 CACHE_SIZE = 100     # Store up to 100 different queries
 
+# Cache warming configuration
+WARM_CACHE_ENABLED = os.getenv('WARM_CACHE_ENABLED', 'true').lower() == 'true'
+WARM_CACHE_HOUR = int(os.getenv('WARM_CACHE_HOUR', 4))  # Off-peak hour (server local time) for the daily refresh
+WARM_CACHE_TIMEOUT = 24 * 3600  # Warmed tags and counts for periods that have already ended
+WARM_REQUEST_INTERVAL = float(os.getenv('WARM_REQUEST_INTERVAL', 1.0))  # Seconds between warm-up requests per account
+
+WARM_LOCK_FILE = os.path.join(tempfile.gettempdir(), 'convertkit-cache-warmer.lock')
+
+# API keys for known clients, keyed by client name. Seeded from
+# CONVERTKIT_CLIENT_KEYS (see check_environment) and filled in as clients
+# connect through OAuth. Only the environment keys survive a restart, so
+# boot-time warming relies on them.
+CLIENT_API_KEYS = json.loads(os.getenv('CONVERTKIT_CLIENT_KEYS', '{}'))
+
+_client_data_lock = threading.RLock()  # Guards CLIENT_DATA and client_data.json
+_cache = {}  # (kind, account, ...) -> (value, expires_at, source)
+_cache_lock = threading.Lock()
+_cache_stats = {'warm_hits': 0, 'hits': 0, 'misses': 0}
+_warm_state = threading.local()
+_account_lock = threading.Lock()
+_account_activity = {}  # account -> {'active': foreground requests in flight, 'last_request': time}
+_credential_accounts = {}  # Authorization header -> account ID, once known
+
+def cache_get(key):
+    """Return a cached value, or None if it is missing or expired"""
+    if getattr(_warm_state, 'active', False):
+        return None  # The warmer always refetches
+    with _cache_lock:
+        entry = _cache.get(key)
+        if entry is None or entry[1] < time.time():
+            _cache.pop(key, None)
+            _cache_stats['misses'] += 1
+            return None
+        _cache_stats['warm_hits' if entry[2] == 'warm' else 'hits'] += 1
+        return entry[0]
+
+def cache_set(key, value, timeout=CACHE_TIMEOUT):
+    """Store a value, tagging it as warmed when set from the warm-up thread"""
+    warming = getattr(_warm_state, 'active', False)
+    with _cache_lock:
+        if key not in _cache and len(_cache) >= CACHE_SIZE:
+            # Evict the entry closest to expiring
+            oldest = min(_cache, key=lambda k: _cache[k][1])
+            del _cache[oldest]
+        _cache[key] = (value, time.time() + timeout, 'warm' if warming else 'request')
+
+def get_cache_stats():
+    """Report warm/cold hit ratios for cached lookups made while handling requests"""
+    with _cache_lock:
+        stats = dict(_cache_stats)
+        stats['entries'] = len(_cache)
+    lookups = stats['warm_hits'] + stats['hits'] + stats['misses']
+    stats['lookups'] = lookups
+    stats['warm_hit_ratio'] = round(stats['warm_hits'] / lookups, 3) if lookups else 0
+    stats['cold_ratio'] = round(stats['misses'] / lookups, 3) if lookups else 0
+    return stats
+
 def check_environment():
+    # Optional settings for the background cache warmer:
+    #   CONVERTKIT_CLIENT_KEYS  JSON object mapping client names in client_data.json
+    #                           to ConvertKit API keys, e.g. {"The Perfect Loaf": "..."}.
+    #                           Keys captured through OAuth are lost on restart, so
+    #                           clients missing here are not warmed after a deploy.
+    #   WARM_CACHE_ENABLED      "false" turns warming off (default "true")
+    #   WARM_CACHE_HOUR         Hour of the daily off-peak refresh (default 4)
+    #   WARM_REQUEST_INTERVAL   Minimum seconds between calls to an account while warming (default 1)
     required_vars = ['CONVERTKIT_CLIENT_ID', 'CONVERTKIT_CLIENT_SECRET', 'FLASK_SECRET_KEY']
     missing_vars = [var for var in required_vars if not os.getenv(var)]
     
@@ -76,16 +144,54 @@ def rate_limited_request(url, headers, params=None):
     MAX_RETRIES = 3
     RETRY_DELAY = 1  # seconds
     
-    for attempt in range(MAX_RETRIES):
-        response = requests.get(url, headers=headers, params=params)
-        
-        if response.status_code == 429:  # Too Many Requests
-            time.sleep(RETRY_DELAY * (attempt + 1))
-            continue
-            
-        return response
+    credential = headers.get('Authorization')
+    account = _credential_accounts.get(credential, credential)
+    warming = getattr(_warm_state, 'active', False)
+    if warming:
+        wait_for_idle_account(account)
+    
+    # Track every call so the warmer can stay out of the way of report traffic
+    with _account_lock:
+        activity = _account_activity.setdefault(account, {'active': 0, 'last_request': 0})
+        if not warming:
+            activity['active'] += 1
     
-    return response  # Return last response if all retries failed
+    try:
+        for attempt in range(MAX_RETRIES):
+            response = requests.get(url, headers=headers, params=params)
+            
+            if response.status_code == 429:  # Too Many Requests
+                time.sleep(RETRY_DELAY * (attempt + 1))
+                continue
+                
+            return response
+        
+        return response  # Return last response if all retries failed
+    finally:
+        with _account_lock:
+            if not warming:
+                activity['active'] -= 1
+            activity['last_request'] = time.time()
+
+def remember_account(api_key, account_id):
+    """Map a credential to its account so rate limiting sees all of an account's keys"""
+    if account_id:
+        _credential_accounts[f'Bearer {api_key}'] = account_id
+
+def wait_for_idle_account(account):
+    """
+    Block the warmer until no request thread is calling the account and
+    WARM_REQUEST_INTERVAL has passed since its last call from any thread
+    """
+    while True:
+        with _account_lock:
+            activity = _account_activity.get(account)
+            if activity is None:
+                return
+            wait = activity['last_request'] + WARM_REQUEST_INTERVAL - time.time()
+            if activity['active'] == 0 and wait <= 0:
+                return
+        time.sleep(wait if wait > 0 else WARM_REQUEST_INTERVAL)
 
 # Form validation
 def validate_form_data(start_date, end_date):
@@ -102,6 +208,14 @@ def validate_form_data(start_date, end_date):
 
 def get_subscribers(api_key, start_date, end_date):
     """Get all subscribers between two dates using cursor-based pagination"""
+    subscribers, _ = crawl_subscribers(api_key, start_date, end_date)
+    return subscribers
+
+def crawl_subscribers(api_key, start_date, end_date):
+    """
+    Get all subscribers between two dates, plus whether every page was fetched.
+    A failed page stops the crawl early and leaves a partial list.
+    """
     url = f"{BASE_URL}/subscribers"
     headers = {'Authorization': f'Bearer {api_key}'}
     params = {
@@ -116,10 +230,12 @@ def get_subscribers(api_key, start_date, end_date):
     print(f"End Date: {end_date}")
     
     subscribers = []
+    complete = False
     
     # Get first page
     response = rate_limited_request(url, headers=headers, params=params)
     if response.status_code == 200:
+        complete = True
         data = response.json()
         current_subscribers = data.get('subscribers', [])
         subscribers.extend(current_subscribers)
@@ -145,11 +261,14 @@ def get_subscribers(api_key, start_date, end_date):
                 print(f"Page {complete_pages + 1} count: {len(current_subscribers)}")
             else:
                 print(f"Error getting page: {response.text}")
+                complete = False
                 break
+    else:
+        print(f"Error getting first page: {response.text}")
     
     total = len(subscribers)
     print(f"Total subscribers found: {total}")
-    return subscribers
+    return subscribers, complete
 
 def get_tagged_subscribers(api_key, tag_id, start_date, end_date):
     """Get tagged subscriber count using optimized pagination"""
@@ -208,11 +327,28 @@ def get_tagged_subscribers(api_key, tag_id, start_date, end_date):
     
     return tagged_subscribers  # Return full list for filtering
 
-def fetch_tags(api_key=None):
-    """Get all tags from ConvertKit API"""
+def fetch_account_id(api_key):
+    """Get the ConvertKit account ID for an API key or access token"""
+    headers = {'Authorization': f'Bearer {api_key}'}
+    response = rate_limited_request(f'{BASE_URL}/account', headers=headers)
+    if response.status_code == 200:
+        account_id = response.json().get('account', {}).get('id')
+        remember_account(api_key, account_id)
+        return account_id
+    print(f"Error getting account: {response.text}")
+    return None
+
+def fetch_tags(api_key=None, account=None):
+    """Get all tags from ConvertKit API, cached per account ID"""
     api_key = api_key or session.get('api_key')
     if not api_key:
         return {'error': 'No API key found', 'all_tags': [], 'suggested': {}}
+    
+    # Without a known account ID, only share the cache with the same key
+    account = account or session.get('account_id') or api_key
+    cached = cache_get(('tags', account))
+    if cached is not None:
+        return cached
         
     try:
         headers = {
@@ -233,7 +369,7 @@ def fetch_tags(api_key=None):
             creator_tag = find_closest_tag(tags, 'creator')
             sparkloop_tag = find_closest_tag(tags, 'sparkloop')
             
-            return {
+            tags_data = {
                 'all_tags': tags,
                 'suggested': {
                     'facebook': facebook_tag,
@@ -241,6 +377,10 @@ def fetch_tags(api_key=None):
                     'sparkloop': sparkloop_tag
                 }
             }
+            # Warmed tag lists have to last until the next scheduled refresh
+            timeout = WARM_CACHE_TIMEOUT if getattr(_warm_state, 'active', False) else CACHE_TIMEOUT
+            cache_set(('tags', account), tags_data, timeout)
+            return tags_data
             
         return {'error': 'Failed to fetch tags', 'all_tags': [], 'suggested': {}}
         
@@ -248,6 +388,35 @@ def fetch_tags(api_key=None):
         print(f"Error getting tags: {str(e)}")
         return {'error': str(e), 'all_tags': [], 'suggested': {}}
 
+def get_baseline_periods(paperboy_start_date):
+    """Return the before/after periods used to measure growth around the Paperboy start date"""
+    before_start = paperboy_start_date - timedelta(days=60)
+    before_end = paperboy_start_date
+    
+    after_start = paperboy_start_date + timedelta(days=45)
+    after_end = after_start + timedelta(days=60)
+    
+    return before_start, before_end, after_start, after_end
+
+def period_has_ended(end_date):
+    """Check whether a period ending on end_date (YYYY-MM-DD) is entirely in the past"""
+    return datetime.strptime(end_date, '%Y-%m-%d').date() < datetime.now().date()
+
+def get_subscriber_count(api_key, account, start_date, end_date):
+    """Get the number of subscribers created between two dates, cached per account"""
+    if not period_has_ended(end_date):
+        # Still collecting subscribers, so always count live
+        return len(get_subscribers(api_key, start_date, end_date))
+    
+    key = ('subscriber_count', account, start_date, end_date)
+    count = cache_get(key)
+    if count is None:
+        subscribers, complete = crawl_subscribers(api_key, start_date, end_date)
+        count = len(subscribers)
+        if complete:  # Never hold on to a count from a crawl that stopped early
+            cache_set(key, count, WARM_CACHE_TIMEOUT)
+    return count
+
 def generate_report(api_key, facebook_tag, creator_tag, sparkloop_tag, start_date, end_date):
     try:
         current_total = int(request.form.get('current_total', 0))
@@ -268,37 +437,34 @@ def generate_report(api_key, facebook_tag, creator_tag, sparkloop_tag, start_dat
         
         # Get client data
         client_name = session.get('selected_client')
+        account = session.get('account_id') or api_key
         client_data = CLIENT_DATA.get(client_name, {})
         paperboy_start_date = datetime.strptime(client_data.get('paperboy_start_date'), '%Y-%m-%d')
         initial_count = client_data.get('initial_subscriber_count', 0)
         
         # Calculate the three periods
-        before_start = paperboy_start_date - timedelta(days=60)
-        before_end = paperboy_start_date
-        
-        after_start = paperboy_start_date + timedelta(days=45)
-        after_end = after_start + timedelta(days=60)
+        before_start, before_end, after_start, after_end = get_baseline_periods(paperboy_start_date)
         
         print(f"\n=== Period Calculations ===")
         print(f"Before period: {before_start.strftime('%Y-%m-%d')} to {before_end.strftime('%Y-%m-%d')}")
         print(f"After period: {after_start.strftime('%Y-%m-%d')} to {after_end.strftime('%Y-%m-%d')}")
         
-        # Get subscribers for before/after periods
-        before_subscribers = get_subscribers(api_key, 
-                                          before_start.strftime('%Y-%m-%d'),
-                                          before_end.strftime('%Y-%m-%d'))
+        # Get subscriber counts for before/after periods
+        before_count = get_subscriber_count(api_key, account,
+                                            before_start.strftime('%Y-%m-%d'),
+                                            before_end.strftime('%Y-%m-%d'))
         
-        after_subscribers = get_subscribers(api_key,
-                                         after_start.strftime('%Y-%m-%d'),
-                                         after_end.strftime('%Y-%m-%d'))
+        after_count = get_subscriber_count(api_key, account,
+                                           after_start.strftime('%Y-%m-%d'),
+                                           after_end.strftime('%Y-%m-%d'))
         
         # Calculate daily averages
-        daily_average_before = round(len(before_subscribers) / 60, 1)
-        daily_average_after = round(len(after_subscribers) / 60, 1)
+        daily_average_before = round(before_count / 60, 1)
+        daily_average_after = round(after_count / 60, 1)
         
         print(f"\n=== Growth Calculations ===")
-        print(f"Before period subscribers: {len(before_subscribers)}")
-        print(f"After period subscribers: {len(after_subscribers)}")
+        print(f"Before period subscribers: {before_count}")
+        print(f"After period subscribers: {after_count}")
         print(f"Daily average before: {daily_average_before}")
         print(f"Daily average after: {daily_average_after}")
         
@@ -364,7 +530,7 @@ def index():
     
     try:
         # Get tags data
-        tags_data = fetch_tags(api_key)
+        tags_data = fetch_tags(api_key, session.get('account_id'))
         tag_options = tags_data.get('all_tags', [])
         suggested_tags = tags_data.get('suggested', {})
         
@@ -377,11 +543,12 @@ def index():
                 if paperboy_start_date and initial_subscriber_count:
                     try:
                         initial_subscriber_count = int(initial_subscriber_count)
-                        CLIENT_DATA[client_name] = {
-                            'paperboy_start_date': paperboy_start_date,
-                            'initial_subscriber_count': initial_subscriber_count
-                        }
-                        save_client_data()
+                        with _client_data_lock:
+                            CLIENT_DATA[client_name] = {
+                                'paperboy_start_date': paperboy_start_date,
+                                'initial_subscriber_count': initial_subscriber_count
+                            }
+                            save_client_data()
                         flash('Client data saved successfully!', 'success')
                     except ValueError:
                         flash('Please enter a valid number for initial subscriber count', 'error')
@@ -465,24 +632,26 @@ def oauth_callback():
             client_name = account_data['account']['name']
             print(f"Selected client: {client_name}")
             
-            # Load existing data from file
-            try:
-                with open('client_data.json', 'r') as f:
-                    CLIENT_DATA.update(json.load(f))
-            except FileNotFoundError:
-                print("No existing client data file found")
-            
-            # Only initialize if client doesn't exist at all
-            if client_name not in CLIENT_DATA:
-                print(f"New client detected: {client_name}")
-                CLIENT_DATA[client_name] = {}
-                save_client_data()
-            else:
-                print(f"Existing client found: {client_name}")
-                print(f"Client data: {CLIENT_DATA[client_name]}")
+            with _client_data_lock:
+                # Load existing data from file
+                load_client_data()
+                
+                # Only initialize if client doesn't exist at all
+                if client_name not in CLIENT_DATA:
+                    print(f"New client detected: {client_name}")
+                    CLIENT_DATA[client_name] = {}
+                    save_client_data()
+                else:
+                    print(f"Existing client found: {client_name}")
+                    print(f"Client data: {CLIENT_DATA[client_name]}")
             
             session['api_key'] = token["access_token"]
             session['selected_client'] = client_name
+            session['account_id'] = account_data['account'].get('id')
+            remember_account(token["access_token"], session['account_id'])
+            
+            # Remember the key so the background warmer can refresh this client
+            CLIENT_API_KEYS[client_name] = token["access_token"]
             
             print(f"Session data set - API Key: {'Present' if 'api_key' in session else 'Missing'}")
             print(f"Session data set - Client: {session.get('selected_client')}")
@@ -547,23 +716,45 @@ def login():
         api_key = request.form.get('api_key')
         if api_key:
             session['api_key'] = api_key
+            # Don't let a previous login's account ID point at this key's cache
+            session.pop('account_id', None)
+            account_id = fetch_account_id(api_key)
+            if account_id:
+                session['account_id'] = account_id
             return redirect(url_for('index'))
     return render_template('index.html')  # We'll use the same template for now
 
 # Initialize the app
 check_environment()
 
+def read_client_data_file():
+    """Read client data from the JSON file without touching CLIENT_DATA"""
+    try:
+        with _client_data_lock, open('client_data.json', 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print("No existing client data file found")
+        return {}
+
+def load_client_data():
+    """Load client data from the JSON file into CLIENT_DATA"""
+    file_data = read_client_data_file()
+    with _client_data_lock:
+        CLIENT_DATA.update(file_data)
+    return CLIENT_DATA
+
 def save_client_data():
     """Save client data to a JSON file"""
     try:
-        print(f"Attempting to save client data: {CLIENT_DATA}")
-        with open('client_data.json', 'w') as f:
-            json.dump(CLIENT_DATA, f)
-        print("Client data saved successfully")
-        
-        # Verify the save by reading back
-        with open('client_data.json', 'r') as f:
-            saved_data = json.load(f)
+        with _client_data_lock:
+            print(f"Attempting to save client data: {CLIENT_DATA}")
+            with open('client_data.json', 'w') as f:
+                json.dump(CLIENT_DATA, f)
+            print("Client data saved successfully")
+            
+            # Verify the save by reading back
+            with open('client_data.json', 'r') as f:
+                saved_data = json.load(f)
         print(f"Verified saved data: {saved_data}")
         
         return True
@@ -616,47 +807,113 @@ def get_tags():
     api_key = session.get('api_key')
     if not api_key:
         return jsonify({'error': 'No API key found'})
-        
+    
+    print("\n=== Getting Tags ===")
+    return jsonify(fetch_tags(api_key, session.get('account_id')))
+
+@app.route('/cache_stats')
+@token_required
+def cache_stats():
+    return jsonify(get_cache_stats())
+
+def warm_client_cache(client_name, api_key, client_data):
+    """Prefetch the tag list and ended baseline period counts for one client"""
+    print(f"\n=== Warming cache for {client_name} ===")
+    account_id = fetch_account_id(api_key)
+    if not account_id:
+        print(f"Could not look up the account for {client_name}, skipping cache warm-up")
+        return
+    fetch_tags(api_key, account_id)
+    
+    start_date = client_data.get('paperboy_start_date')
+    if not start_date:
+        print(f"No Paperboy start date for {client_name}, skipping baseline periods")
+        return
+    
+    before_start, before_end, after_start, after_end = get_baseline_periods(
+        datetime.strptime(start_date, '%Y-%m-%d'))
+    for period_start, period_end in ((before_start, before_end), (after_start, after_end)):
+        period_start = period_start.strftime('%Y-%m-%d')
+        period_end = period_end.strftime('%Y-%m-%d')
+        if period_has_ended(period_end):
+            get_subscriber_count(api_key, account_id, period_start, period_end)
+
+def warm_cache():
+    """Warm the cache for every client in client_data.json that has a known API key"""
+    # Work from a snapshot so request threads can keep changing CLIENT_DATA
+    with _client_data_lock:
+        clients = dict(CLIENT_DATA)
+        clients.update(read_client_data_file())
+    
+    _warm_state.active = True
     try:
-        print("\n=== Getting Tags ===")
-        headers = {
-            'Authorization': f'Bearer {api_key}',
-            'Content-Type': 'application/json'
-        }
-        
-        response = rate_limited_request(
-            f'{BASE_URL}/tags',
-            headers=headers
-        )
-        
-        if response.status_code == 200:
-            tags = response.json().get('tags', [])
-            
-            # Find suggested tags
-            facebook_tag = find_closest_tag(tags, 'facebook')
-            creator_tag = find_closest_tag(tags, 'creator')
-            sparkloop_tag = find_closest_tag(tags, 'sparkloop')
-            
-            print("Found tags:", {
-                'facebook': facebook_tag,
-                'creator': creator_tag,
-                'sparkloop': sparkloop_tag
-            })
-            
-            return jsonify({
-                'all_tags': tags,
-                'suggested': {
-                    'facebook': facebook_tag,
-                    'creator': creator_tag,
-                    'sparkloop': sparkloop_tag
-                }
-            })
-            
-        return jsonify({'error': 'Failed to fetch tags'})
-        
-    except Exception as e:
-        print(f"Error getting tags: {str(e)}")
-        return jsonify({'error': str(e)})
+        for client_name, client_data in clients.items():
+            api_key = CLIENT_API_KEYS.get(client_name)
+            if not api_key:
+                print(f"No API key for {client_name}, skipping cache warm-up")
+                continue
+            try:
+                warm_client_cache(client_name, api_key, client_data)
+            except Exception as e:
+                print(f"Error warming cache for {client_name}: {str(e)}")
+                traceback.print_exc()
+    finally:
+        _warm_state.active = False
+    print(f"Cache warm-up finished. Stats: {get_cache_stats()}")
+
+def seconds_until_next_warm(now=None):
+    """Seconds until the next off-peak refresh at WARM_CACHE_HOUR"""
+    now = now or datetime.now()
+    next_run = now.replace(hour=WARM_CACHE_HOUR, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+def run_cache_warmer():
+    """Warm the cache at startup, then once a day at the off-peak hour"""
+    while True:
+        try:
+            warm_cache()
+        except Exception as e:
+            print(f"Cache warm-up failed: {str(e)}")
+            traceback.print_exc()
+        time.sleep(seconds_until_next_warm())
+
+_warm_lock_file = None
+
+def start_cache_warmer():
+    """
+    Start the warm-up scheduler in a daemon thread, outside request handling.
+    The cache lives in process memory, so the app is meant to run as a single
+    gunicorn worker (see gunicorn.conf.py). A file lock makes sure only one
+    process per host warms, whatever the worker count.
+    """
+    global _warm_lock_file
+    if not WARM_CACHE_ENABLED:
+        print("Cache warming disabled")
+        return None
+    
+    lock_file = open(WARM_LOCK_FILE, 'w')
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        print("Cache warmer already running in another process")
+        return None
+    _warm_lock_file = lock_file  # Held for the life of the process
+    
+    clients = read_client_data_file()
+    warmable = [name for name in clients if name in CLIENT_API_KEYS]
+    if not warmable:
+        print("WARNING: Cache warming is enabled but no client in client_data.json has an API key "
+              "in CONVERTKIT_CLIENT_KEYS. Nothing will be warmed until clients log in.")
+    else:
+        print(f"Cache warming {len(warmable)} of {len(clients)} clients: {', '.join(warmable)}")
+    
+    thread = threading.Thread(target=run_cache_warmer, name='cache-warmer', daemon=True)
+    thread.start()
+    return thread
 
 if __name__ == '__main__':
-    app.run(ssl_context='adhoc')
\ No newline at end of file
+    start_cache_warmer()
+    app.run(ssl_context='adhoc')
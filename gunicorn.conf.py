@@ -0,0 +1,9 @@
+# The report cache lives in process memory, so run a single worker and
+# handle concurrency with threads instead of extra processes.
+workers = 1
+threads = 4
+
+def post_worker_init(worker):
+    # Start the cache warmer once the worker has loaded the app
+    from app import start_cache_warmer
+    start_cache_warmer()
@@ -0,0 +1,33 @@
+import importlib
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def app_module(tmp_path_factory):
+    """Import app.py against a throwaway config.json and environment"""
+    workdir = tmp_path_factory.mktemp('app')
+    (workdir / 'config.json').write_text(json.dumps({'api_key': 'test', 'base_url': 'http://localhost'}))
+    os.environ.setdefault('CONVERTKIT_CLIENT_ID', 'test')
+    os.environ.setdefault('CONVERTKIT_CLIENT_SECRET', 'test')
+    os.environ.setdefault('FLASK_SECRET_KEY', 'test')
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        return importlib.import_module('app')
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.fixture
+def app(app_module, tmp_path, monkeypatch):
+    """The app module with an empty cache, run from a clean directory"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(app_module, '_cache', {})
+    monkeypatch.setattr(app_module, '_cache_stats', {'warm_hits': 0, 'hits': 0, 'misses': 0})
+    return app_module
@@ -0,0 +1,233 @@
+import json
+from datetime import datetime
+
+
+def test_cache_get_returns_value_until_expiry(app, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(app.time, 'time', lambda: now)
+    app.cache_set(('tags', 'Client'), ['tag'], timeout=60)
+
+    assert app.cache_get(('tags', 'Client')) == ['tag']
+
+    now += 61
+    assert app.cache_get(('tags', 'Client')) is None
+    assert ('tags', 'Client') not in app._cache
+
+
+def test_cache_set_evicts_entry_closest_to_expiring(app, monkeypatch):
+    monkeypatch.setattr(app, 'CACHE_SIZE', 2)
+    app.cache_set('short', 1, timeout=10)
+    app.cache_set('long', 2, timeout=100)
+    app.cache_set('new', 3, timeout=50)
+
+    assert set(app._cache) == {'long', 'new'}
+
+
+def test_cache_stats_ratios(app):
+    app._warm_state.active = True
+    try:
+        app.cache_set('warmed', 1)
+    finally:
+        app._warm_state.active = False
+    app.cache_set('requested', 2)
+
+    app.cache_get('warmed')
+    app.cache_get('requested')
+    app.cache_get('missing')
+    app.cache_get('missing')
+
+    stats = app.get_cache_stats()
+    assert stats['lookups'] == 4
+    assert stats['warm_hits'] == 1
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+    assert stats['warm_hit_ratio'] == 0.25
+    assert stats['cold_ratio'] == 0.5
+
+
+def test_cache_get_bypassed_while_warming(app):
+    app.cache_set('key', 1)
+    app._warm_state.active = True
+    try:
+        assert app.cache_get('key') is None
+    finally:
+        app._warm_state.active = False
+    assert app.get_cache_stats()['lookups'] == 0
+
+
+def test_seconds_until_next_warm_before_hour(app, monkeypatch):
+    monkeypatch.setattr(app, 'WARM_CACHE_HOUR', 4)
+    assert app.seconds_until_next_warm(datetime(2024, 5, 1, 3, 30)) == 30 * 60
+
+
+def test_seconds_until_next_warm_at_and_after_hour(app, monkeypatch):
+    monkeypatch.setattr(app, 'WARM_CACHE_HOUR', 4)
+    assert app.seconds_until_next_warm(datetime(2024, 5, 1, 4, 0)) == 24 * 3600
+    assert app.seconds_until_next_warm(datetime(2024, 5, 1, 5, 0)) == 23 * 3600
+
+
+def test_subscriber_count_only_cached_for_ended_periods(app, monkeypatch):
+    calls = []
+    monkeypatch.setattr(app, 'get_subscribers', lambda *args: calls.append(args) or [{}] * 3)
+    monkeypatch.setattr(app, 'crawl_subscribers', lambda *args: calls.append(args) or ([{}] * 3, True))
+
+    assert app.get_subscriber_count('token', 1, '2020-01-01', '2020-03-01') == 3
+    assert app.get_subscriber_count('token', 1, '2020-01-01', '2020-03-01') == 3
+    assert len(calls) == 1
+
+    future = datetime.now().replace(year=datetime.now().year + 1).strftime('%Y-%m-%d')
+    app.get_subscriber_count('token', 1, '2020-01-01', future)
+    app.get_subscriber_count('token', 1, '2020-01-01', future)
+    assert len(calls) == 3
+
+
+def test_subscriber_count_isolated_between_accounts(app, monkeypatch):
+    counts = {'token-a': [{}] * 3, 'token-b': [{}] * 7}
+    monkeypatch.setattr(app, 'crawl_subscribers', lambda api_key, *args: (counts[api_key], True))
+
+    assert app.get_subscriber_count('token-a', 1, '2020-01-01', '2020-03-01') == 3
+    assert app.get_subscriber_count('token-b', 2, '2020-01-01', '2020-03-01') == 7
+
+
+def test_warm_cache_skips_clients_without_key(app, monkeypatch):
+    with open('client_data.json', 'w') as f:
+        json.dump({'Known': {}, 'Unknown': {}}, f)
+    monkeypatch.setattr(app, 'CLIENT_API_KEYS', {'Known': 'key'})
+    warmed = []
+    monkeypatch.setattr(app, 'warm_client_cache', lambda name, key, data: warmed.append((name, key)))
+
+    app.warm_cache()
+
+    assert warmed == [('Known', 'key')]
+    assert not getattr(app._warm_state, 'active', False)
+
+
+def test_warm_cache_continues_after_client_error(app, monkeypatch):
+    with open('client_data.json', 'w') as f:
+        json.dump({'Broken': {}, 'Working': {}}, f)
+    monkeypatch.setattr(app, 'CLIENT_API_KEYS', {'Broken': 'a', 'Working': 'b'})
+    warmed = []
+
+    def warm_client_cache(name, key, data):
+        if name == 'Broken':
+            raise ValueError('boom')
+        warmed.append(name)
+
+    monkeypatch.setattr(app, 'warm_client_cache', warm_client_cache)
+    app.warm_cache()
+
+    assert warmed == ['Working']
+
+
+def test_warm_client_cache_keys_entries_by_account_id(app, monkeypatch):
+    monkeypatch.setattr(app, 'WARM_REQUEST_INTERVAL', 0)
+    monkeypatch.setattr(app, 'fetch_account_id', lambda api_key: 42)
+    monkeypatch.setattr(app, 'crawl_subscribers', lambda *args: ([{}] * 5, True))
+    monkeypatch.setattr(app, 'rate_limited_request', lambda *args, **kwargs: type(
+        'Response', (), {'status_code': 200, 'json': lambda self: {'tags': []}})())
+
+    app._warm_state.active = True
+    try:
+        app.warm_client_cache('Client', 'env-key', {'paperboy_start_date': '2020-01-01'})
+    finally:
+        app._warm_state.active = False
+
+    assert app.cache_get(('tags', 42)) is not None
+    assert app.cache_get(('subscriber_count', 42, '2019-11-02', '2020-01-01')) == 5
+    assert app.get_cache_stats()['warm_hits'] == 2
+
+
+def test_cache_stats_requires_login(app):
+    response = app.app.test_client().get('/cache_stats')
+    assert response.status_code == 302
+
+
+def test_warmed_tags_last_until_next_refresh(app, monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(app.time, 'time', lambda: now)
+    monkeypatch.setattr(app, 'rate_limited_request', lambda *args, **kwargs: type(
+        'Response', (), {'status_code': 200, 'json': lambda self: {'tags': []}})())
+
+    app._warm_state.active = True
+    try:
+        app.fetch_tags('key', 'account-1')
+    finally:
+        app._warm_state.active = False
+
+    now += 6 * 3600
+    assert app.cache_get(('tags', 'account-1')) is not None
+
+
+def test_partial_crawl_count_not_cached(app, monkeypatch):
+    responses = iter([
+        {'status_code': 200, 'json': {'subscribers': [{}] * 2,
+                                      'pagination': {'has_next_page': True, 'end_cursor': 'c'}}},
+        {'status_code': 429, 'json': {}, 'text': 'Too Many Requests'},
+    ])
+
+    def rate_limited_request(*args, **kwargs):
+        data = next(responses)
+        return type('Response', (), {'status_code': data['status_code'], 'text': data.get('text', ''),
+                                     'json': lambda self: data['json']})()
+
+    monkeypatch.setattr(app, 'rate_limited_request', rate_limited_request)
+
+    assert app.get_subscriber_count('token', 1, '2020-01-01', '2020-03-01') == 2
+    assert ('subscriber_count', 1, '2020-01-01', '2020-03-01') not in app._cache
+
+
+def test_start_cache_warmer_warns_without_keys(app, monkeypatch, capsys):
+    with open('client_data.json', 'w') as f:
+        json.dump({'Client': {}}, f)
+    monkeypatch.setattr(app, 'CLIENT_API_KEYS', {})
+    monkeypatch.setattr(app, 'WARM_CACHE_ENABLED', True)
+    monkeypatch.setattr(app, 'WARM_LOCK_FILE', 'warmer.lock')
+    monkeypatch.setattr(app, 'run_cache_warmer', lambda: None)
+    monkeypatch.setattr(app, '_warm_lock_file', None)
+
+    app.start_cache_warmer().join()
+
+    assert 'no client in client_data.json has an API key' in capsys.readouterr().out
+    app._warm_lock_file.close()
+
+
+def test_warmer_waits_for_foreground_requests(app, monkeypatch):
+    monkeypatch.setattr(app, 'WARM_REQUEST_INTERVAL', 0.05)
+    monkeypatch.setattr(app, '_account_activity', {7: {'active': 1, 'last_request': 0}})
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        app._account_activity[7] = {'active': 0, 'last_request': 0}
+
+    monkeypatch.setattr(app.time, 'sleep', sleep)
+    app.wait_for_idle_account(7)
+
+    assert sleeps == [0.05]
+
+
+def test_rate_limited_request_tracks_account_across_credentials(app, monkeypatch):
+    monkeypatch.setattr(app, '_account_activity', {})
+    monkeypatch.setattr(app, '_credential_accounts', {})
+    monkeypatch.setattr(app.requests, 'get', lambda *args, **kwargs: type('Response', (), {'status_code': 200})())
+    app.remember_account('oauth-token', 7)
+    app.remember_account('env-key', 7)
+
+    app.rate_limited_request('url', headers={'Authorization': 'Bearer oauth-token'})
+
+    assert list(app._account_activity) == [7]
+    assert app._account_activity[7]['active'] == 0
+    assert app._account_activity[7]['last_request'] > 0
+
+
+def test_save_client_data_holds_lock(app, monkeypatch):
+    held = []
+    real_dump = app.json.dump
+
+    def dump(*args, **kwargs):
+        held.append(app._client_data_lock._is_owned())
+        return real_dump(*args, **kwargs)
+
+    monkeypatch.setattr(app.json, 'dump', dump)
+    assert app.save_client_data()
+    assert held == [True]